@@ -22,38 +22,13 @@ Some information was used from dmmut61e utility by Steffen Vogel
 
 from __future__ import print_function
 import sys
-from decimal import Decimal
+import array
 import struct
+import collections
 import logging
+import time
 import datetime
 
-def test_bit(int_type, offset):
-    """
-    testBit() returns True if the bit at 'offset' is one.
-    From http://wiki.python.org/moin/BitManipulation
-    """
-    mask = 1 << offset
-    return bool(int_type & mask)
-
-def get_bits(int_type, template):
-    """
-    Extracts 'named bits' from int_type.
-    Naming the bits works by supplying a list of
-    bit names (or fixed bits as 0/1) via template.
-    """
-    bits = {}
-    for i in range(4):
-        bit = test_bit(int_type, i)
-        bit_name = template[3-i]
-        #print(bit, bit_name, i)
-        if bit_name in (0,1) and bit==bit_name:
-            continue
-        elif bit_name in (0,1):
-            raise ValueError
-        else:
-           bits[bit_name] = bit
-    return bits
-
 """
 The entries in the following RANGE dictionaries have the following structure:
 
@@ -63,6 +38,10 @@ value_multiplier:  Multiply the displayed value by this factor to get the value
 dp_digit_position: The digit position of the decimal point in the displayed meter reading value.
 display_unit:      The unit the displayed value is shown in.
 """
+# Powers of ten for the possible decimal point positions,
+# precomputed so the parser does not evaluate 10**dp per packet.
+POW10 = (1, 10, 100, 1000)
+
 RANGE_DIODE = [
     (1e0, 3, "V"), #6.000V
 ]
@@ -124,6 +103,11 @@ RANGE_CURRENT_AUTO_MA = [
     (1e-3, 1, "mA"), #2
 ]
 
+# Used instead of RANGE_FREQUENCY when the JUDGE bit is set.
+RANGE_DUTY_CYCLE = [
+    (1e0, 1, "%"), #600.0%
+]
+
 FUNCTION = {
     # (function, subfunction, unit)
     0x01: ("diode", RANGE_DIODE, "V"),
@@ -139,6 +123,51 @@ FUNCTION = {
     0x0f: ("current", RANGE_CURRENT_AUTO_MA, "A"),
 }
 
+def _build_function_lut():
+    """
+    Flattens FUNCTION and the RANGE_* tables into one lookup table for
+    parse(), keyed by (function nibble)<<8 | (range nibble)<<1 | judge bit.
+    Each entry is a (mode, unit, multiplier, dp, display_unit) tuple with
+    the frequency/duty-cycle switch (JUDGE bit) already baked in.
+    """
+    lut = {}
+    for func, (mode, ranges, unit) in FUNCTION.items():
+        if ranges is None:
+            continue
+        for range_, (multiplier, dp, display_unit) in enumerate(ranges):
+            for judge in (0, 1):
+                if mode == "frequency" and judge:
+                    multiplier, dp, display_unit = RANGE_DUTY_CYCLE[0]
+                    entry = ("duty_cycle", "%", multiplier, dp, display_unit)
+                else:
+                    entry = (mode, unit, multiplier, dp, display_unit)
+                lut[func << 8 | range_ << 1 | judge] = entry
+    return lut
+
+_FUNCTION_LUT = _build_function_lut()
+
+def _build_flat_tables():
+    """
+    Derives flat structure-of-arrays views of _FUNCTION_LUT, indexed by
+    function<<5 | range<<1 | judge. The multiplier and decimal point
+    live in dense C-typed arrays, so parse() reads three adjacent array
+    slots instead of chasing dict -> tuple -> element pointers; invalid
+    function/range combinations are marked with dp == -1.
+    """
+    mult = array.array('d', [float('nan')] * 512)
+    dp = array.array('b', [-1] * 512)
+    mode = [None] * 512
+    unit = [None] * 512
+    display_unit = [None] * 512
+    for key, entry in _FUNCTION_LUT.items():
+        idx = (key >> 8) << 5 | (key & 0xff)
+        mode[idx], unit[idx], mult[idx] = entry[0], entry[1], entry[2]
+        dp[idx] = entry[3]
+        display_unit[idx] = entry[4]
+    return mult, dp, mode, unit, display_unit
+
+_MULT, _DP, _MODE, _UNIT, _DISPLAY_UNIT = _build_flat_tables()
+
 STATUS = [
     "JUDGE", # 1-°C, 0-°F.
     "SIGN", # 1-minus sign, 0-no sign
@@ -160,139 +189,309 @@ OPTION2 = [
     0,
 ]
 
-def parse(packet):
+def _build_bit_table(template):
+    """
+    Precomputes the decode of a status/option nibble for all 16 values.
+    The template lists the bit names MSB first, with fixed bits as 0/1.
+    Each entry is a tuple of booleans for the named bits, or None if the
+    nibble violates a fixed bit (parse() raises ValueError on those).
+    """
+    table = []
+    for nibble in range(16):
+        bits = []
+        for i, name in enumerate(template):
+            bit = bool(nibble & (1 << (3 - i)))
+            if name in (0, 1):
+                if bit != bool(name):
+                    bits = None
+                    break
+            else:
+                bits.append(bit)
+        table.append(tuple(bits) if bits is not None else None)
+    return tuple(table)
+
+STATUS_TBL = _build_bit_table(STATUS)
+OPTION1_TBL = _build_bit_table(OPTION1)
+OPTION2_TBL = _build_bit_table(OPTION2)
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+def _parse_core(lo, hi):
+    """
+    Integer core of parse(): takes the first eight packet bytes packed
+    little-endian into one 64-bit word plus the ninth byte and returns
+    the decoded fields as plain ints, with the sign already applied to
+    the display value. Kept free of Python containers so numba can
+    compile it in nopython mode when installed; without numba it runs
+    unchanged as ordinary Python.
+    """
+    display_value = (((lo >> 8) & 0x0f) * 1000 + ((lo >> 16) & 0x0f) * 100
+                     + ((lo >> 24) & 0x0f) * 10 + ((lo >> 32) & 0x0f))
+    d_status = (lo >> 48) & 0x0f
+    # Branchless negation from the SIGN bit: sign is 0 or -1, and
+    # (x ^ -1) - -1 == -x while (x ^ 0) - 0 == x.
+    sign = -((d_status >> 2) & 1)
+    display_value = (display_value ^ sign) - sign
+    return (lo & 0x0f, display_value, (lo >> 40) & 0x0f, d_status,
+            (lo >> 56) & 0x0f, hi & 0x0f)
+
+if njit is not None:
+    _parse_core = njit(cache=True)(_parse_core)
+
+# Packs a packet into the (lo, hi) pair _parse_core expects in one C
+# call. A prebuilt Struct skips re-parsing the format string per packet,
+# and unpack_from accepts any buffer-protocol object (bytes, bytearray,
+# memoryview), not just bytes.
+_UNPACK_PACKET = struct.Struct("<QB").unpack_from
+
+CSV_FIELDS = ["value", "unit", "mode", "current", "operation", "peak",
+            "battery_low", "hold"]
+
+# Parsed packet as returned by parse(). Attribute access is cheaper than
+# the string-keyed dict this used to be, and the tuple can be unpacked
+# positionally by the output helpers.
+Result = collections.namedtuple('Result',
+    CSV_FIELDS + ["display_value", "display_unit", "range"])
+
+def parse(packet, _njit=njit, _STATUS_TBL=STATUS_TBL,
+          _OPTION1_TBL=OPTION1_TBL, _OPTION2_TBL=OPTION2_TBL,
+          _DP=_DP, _MULT=_MULT, _MODE=_MODE, _UNIT=_UNIT,
+          _DISPLAY_UNIT=_DISPLAY_UNIT, _POW10=POW10,
+          _unpack=_UNPACK_PACKET, _core=_parse_core, _Result=Result):
     """
     The most important function of this module:
     Parses 9-byte-long packets from the UT803 DMM and returns
-    a dictionary with all information extracted from the packet.
+    a Result namedtuple with all information extracted from the packet.
+    Accepts bytes, bytearray or any buffer-protocol object. The keyword
+    arguments only bind module globals as locals; leave them alone.
     """
-    d_range, \
-    d_digit0, d_digit1, d_digit2, d_digit3, \
-    d_function, d_status, \
-    d_option1, d_option2 = struct.unpack("B"*9, packet)
-    
-    options = {}
-    d_options = (d_status, d_option1, d_option2)
-    OPTIONS = (STATUS, OPTION1, OPTION2)
-    for d_option, OPTION in zip(d_options, OPTIONS):
-        bits = get_bits(d_option, OPTION)
-        options.update(bits)
-    
-    function = FUNCTION[d_function & 0x0f]
-
-    mode = function[0]
-    m_range =  function[1][d_range & 0x0f]
-    unit = function[2]
-    if mode == "frequency" and options["JUDGE"]:
-        mode = "duty_cycle"
-        unit = "%"
-        m_range = (1e0, 1, "%") #2200.0°C
-    
+    if _njit is None and isinstance(packet, (bytes, bytearray)):
+        # Pure-Python fast path: direct indexing and integer-only
+        # locals, which PyPy's JIT turns into raw memory loads and
+        # CPython runs without a call into _parse_core.
+        display_value = ((packet[1] & 0x0f) * 1000 + (packet[2] & 0x0f) * 100
+                         + (packet[3] & 0x0f) * 10 + (packet[4] & 0x0f))
+        d_status = packet[6] & 0x0f
+        sign = -((d_status >> 2) & 1)
+        display_value = (display_value ^ sign) - sign
+        d_range = packet[0] & 0x0f
+        d_function = packet[5] & 0x0f
+        d_option1 = packet[7] & 0x0f
+        d_option2 = packet[8] & 0x0f
+    else:
+        # Compiled core (numba installed) or non-bytes buffer input.
+        lo, hi = _unpack(packet)
+        d_range, display_value, d_function, d_status, d_option1, d_option2 = \
+            _core(lo, hi)
+
+    judge, sign, batt, ol = _STATUS_TBL[d_status]
+    option1 = _OPTION1_TBL[d_option1]
+    option2 = _OPTION2_TBL[d_option2]
+    if option1 is None or option2 is None:
+        raise ValueError
+    # data hold mode, received value is actual!
+    hold, maximum, minimum = option1
+    dc, ac, auto = option2
+
+    idx = d_function << 5 | d_range << 1 | judge
+    dp = _DP[idx]
+    if dp < 0:
+        raise ValueError
+    mode = _MODE[idx]
+    unit = _UNIT[idx]
+    display_unit = _DISPLAY_UNIT[idx]
+
     current = None
-    if options["AC"] and options["DC"]:
+    if ac and dc:
         raise ValueError
-    elif options["DC"]:
+    elif dc:
         current = "DC"
-    elif options["AC"]:
+    elif ac:
         current = "AC"
-    
-    operation = "normal"
-    if options["OL"]:
-        operation = "overload"
-    
-    if options["AUTO"]:
+
+    if auto:
         mrange = "auto"
     else:
         mrange = "manual"
-    
-    if options["BATT"]:
-        battery_low = True
-    else:
-        battery_low = False
-    
-    # data hold mode, received value is actual!
-    if options["HOLD"]:
-        hold = True
-    else:
-        hold = False
-    
+
     peak = None
-    if options["MAX"]:
+    if maximum:
         peak = "max"
-    elif options["MIN"]:
+    elif minimum:
         peak = "min"
-    
-    digits = [d_digit0, d_digit1, d_digit2, d_digit3]
-    digits = [digit & 0x0f for digit in digits]
-    
-    display_value = 0
-    for i, digit in zip(range(4), digits):
-        display_value += digit*(10**(3-i))
-    if options["SIGN"]: display_value = -display_value
-    display_value = Decimal(display_value) / 10**m_range[1]
-    display_unit = m_range[2]
-    value = float(display_value) * m_range[0]
-    
-    if operation != "normal":
-        display_value = ""
-        value = ""
-    results = {
-        'value'         : value,
-        'unit'          : unit,
-        'display_value' : display_value,
-        'display_unit'  : display_unit,
-        'mode'          : mode,
-        'current'       : current,
-        'peak'          : peak,
-        'hold'          : hold,
-        'range'         : mrange,
-        'operation'     : operation,
-        'battery_low'   : battery_low
+
+    # An overloaded reading carries no usable digits; skip the scaling
+    # and display formatting they would otherwise pay for.
+    if ol:
+        return _Result(value="", unit=unit, mode=mode, current=current,
+                      operation="overload", peak=peak, battery_low=batt,
+                      hold=hold, display_value="",
+                      display_unit=display_unit, range=mrange)
+
+    value = display_value * _MULT[idx] / _POW10[dp]
+    display_value = "{:.{}f}".format(display_value / _POW10[dp], dp)
+    return _Result(value=value, unit=unit, mode=mode, current=current,
+                  operation="normal", peak=peak, battery_low=batt,
+                  hold=hold, display_value=display_value,
+                  display_unit=display_unit, range=mrange)
+
+_NP_LUT = None
+def _get_np_lut():
+    """
+    Builds (lazily, on first use) NumPy views of _FUNCTION_LUT for
+    parse_batch(): flat arrays of multiplier, decimal point divisor and
+    the mode/unit strings, indexed by function<<5 | range<<1 | judge.
+    Invalid function/range combinations carry a NaN multiplier.
+    """
+    global _NP_LUT
+    if _NP_LUT is None:
+        import numpy as np
+        mult = np.full(512, np.nan)
+        div = np.ones(512)
+        mode = np.full(512, "", dtype=object)
+        unit = np.full(512, "", dtype=object)
+        display_unit = np.full(512, "", dtype=object)
+        for key, entry in _FUNCTION_LUT.items():
+            idx = (key >> 8) << 5 | (key & 0xff)
+            mode[idx], unit[idx], mult[idx] = entry[0], entry[1], entry[2]
+            div[idx] = POW10[entry[3]]
+            display_unit[idx] = entry[4]
+        _NP_LUT = (mult, div, mode, unit, display_unit)
+    return _NP_LUT
+
+def parse_batch(packets):
+    """
+    Vectorized variant of parse() for post-processing recorded data:
+    takes a bytes-like object of N concatenated 9-byte packets (without
+    line terminators) and returns a dict of NumPy arrays keyed like the
+    per-packet results. The value is NaN for overloaded or invalid
+    packets and no display_value strings are built.
+    Requires numpy; it is imported here so live logging works without it.
+    """
+    import numpy as np
+
+    a = np.frombuffer(packets, np.uint8).reshape(-1, 9)
+    d_range = a[:, 0] & 0x0f
+    digits = a[:, 1:5] & 0x0f
+    display_value = (digits * np.array([1000, 100, 10, 1])).sum(1)
+    d_function = a[:, 5] & 0x0f
+
+    status = a[:, 6]
+    judge = (status >> 3) & 1
+    sign = (status >> 2) & 1
+    batt = (status >> 1) & 1
+    ol = status & 1
+    option1 = a[:, 7]
+    option2 = a[:, 8]
+    if ((option1 | option2) & 1).any():
+        raise ValueError
+    hold = (option1 >> 3) & 1
+    maximum = (option1 >> 2) & 1
+    minimum = (option1 >> 1) & 1
+    dc = (option2 >> 3) & 1
+    ac = (option2 >> 2) & 1
+    auto = (option2 >> 1) & 1
+    if (ac & dc).any():
+        raise ValueError
+
+    mult, div, mode, unit, display_unit = _get_np_lut()
+    idx = d_function.astype(np.intp) << 5 | d_range << 1 | judge
+    value = np.where(sign, -display_value, display_value) \
+            * np.take(mult, idx) / np.take(div, idx)
+    value[ol.astype(bool)] = np.nan
+
+    return {
+        'value'        : value,
+        'unit'         : np.take(unit, idx),
+        'display_unit' : np.take(display_unit, idx),
+        'mode'         : np.take(mode, idx),
+        'current'      : np.take(np.array([None, "AC", "DC", None], object),
+                                 ac | dc << 1),
+        'peak'         : np.take(np.array([None, "min", "max", "max"], object),
+                                 minimum | maximum << 1),
+        'hold'         : hold.astype(bool),
+        'range'        : np.where(auto.astype(bool), "auto", "manual"),
+        'operation'    : np.where(ol.astype(bool), "overload", "normal"),
+        'battery_low'  : batt.astype(bool),
     }
-    
-    return results
 
 def output_readable(results):
-    operation = results["operation"]
-    battery_low = results["battery_low"]
+    operation = results.operation
+    battery_low = results.battery_low
     if operation == "normal":
-        display_value = results["display_value"]
-        display_unit = results["display_unit"]
-        line = "{value} {unit}".format(value=display_value, unit=display_unit)
+        line = "{value} {unit}".format(value=results.display_value,
+                                       unit=results.display_unit)
     else:
         line = "-, the measurement is {operation}ed!".format(operation=operation)
     if battery_low:
         line.append(" Battery low!")
     return line
 
-def format_field(results, field_name):
+def output_csv(results):
     """
-    Helper function for output formatting.
+    Helper function to write output lines to a CSV file.
     """
-    value = results[field_name]
-    if field_name == "value":
-        if results["operation"]=="normal":
-            return str(value)
-        else:
-            return ""
-    if value==None:
-        return ""
-    elif value==True:
-        return "1"
-    elif value==False:
-        return "0"
-    else:
-        return str(value)
+    return (f"{results.value};{results.unit};{results.mode};"
+            f"{results.current or ''};{results.operation};"
+            f"{results.peak or ''};"
+            f"{int(results.battery_low)};{int(results.hold)}")
 
-CSV_FIELDS = ["value", "unit", "mode", "current", "operation", "peak",
-            "battery_low", "hold"]
-def output_csv(results):
+# Prefer the optional Cython accelerator when it has been built
+# (python setup.py build_ext --inplace, see es51922_c.pyx).
+try:
+    from es51922_c import parse
+except ImportError:
+    pass
+
+def read_frames(stream, buffer_size=1<<16):
     """
-    Helper function to write output lines to a CSV file.
+    Splits a raw byte stream into LF-terminated frames (a trailing CR
+    is stripped, the terminator is not included) without a read call
+    per frame: reads large chunks into one reusable buffer and yields
+    memoryview slices of it, so a burst of packets costs one read call
+    and no copies. A frame split across two reads is moved to the front
+    of the buffer before the next read. An unterminated tail at EOF is
+    yielded as a final frame, like readline() used to return it.
     """
-    field_data = [format_field(results, field_name) for field_name in CSV_FIELDS]
-    line = ";".join(field_data)
-    return line
+    buf = bytearray(buffer_size)
+    mv = memoryview(buf)
+    n = 0
+    # readinto on a buffered stream blocks until the whole slice is
+    # filled, which would hold back a slow live stream until ~64 KiB
+    # arrived; readinto1 issues at most one underlying read and returns
+    # whatever is available. Raw streams only offer readinto, which
+    # already returns after one read.
+    readinto = getattr(stream, 'readinto1', stream.readinto)
+    while True:
+        if n == buffer_size:
+            # No terminator in a whole buffer: not a multimeter stream.
+            logging.warning('Discarding {} bytes without a line terminator'
+                            .format(n))
+            n = 0
+        count = readinto(mv[n:])
+        if not count:
+            if n:
+                yield mv[:n]
+            return
+        end = n + count
+        start = 0
+        while True:
+            terminator = buf.find(b'\n', start, end)
+            if terminator < 0:
+                break
+            stop = terminator
+            if stop > start and buf[stop-1] == 0x0d:
+                stop -= 1
+            yield mv[start:stop]
+            start = terminator + 1
+        if start:
+            buf[:end-start] = buf[start:end]
+            n = end - start
+        else:
+            n = end
 
 def main():
     """
@@ -301,6 +500,7 @@ def main():
     Prints to stdout and to a CSV file.
     """
     import argparse
+    import atexit
     parser = argparse.ArgumentParser(description='Utility for parsing data from multimeters based on Cyrustek ES51922 chipset.')
     parser.add_argument('-m', '--mode', choices=['csv', 'plot', 'readable'],
                         default="csv",
@@ -326,7 +526,10 @@ def main():
             file_name = args.file
         else:
             file_name = "measurement_{}.csv".format(timestamp)
-        output_file = open(file_name, "w")
+        # Large write buffer: a high-rate logger should not pay a
+        # syscall per 9-byte record.
+        output_file = open(file_name, "w", buffering=1<<16)
+        atexit.register(output_file.close)
         logging.info('Writing to file "{}"'.format(file_name))
         header = "timestamp;{}\n".format(";".join(CSV_FIELDS))
         output_file.write(header)
@@ -335,44 +538,56 @@ def main():
             file_name = args.file
         else:
             logging.error('No file name specified')
-    while True:
-        line = sys.stdin.readline()
-        if not line: break
-        line = line.strip()
-        try:
-            line = line.encode('ascii')
-        except:
-            logging.warning('Not an ASCII input line, ignoring: "{}"'.format(line))
-            continue
-        timestamp = datetime.datetime.now()
-        timestamp = timestamp.isoformat(sep=' ')
+        # Line-buffered so the plotting script sees fresh data without
+        # paying an open/close per packet.
+        output_file = open(file_name, 'a', buffering=1)
+        atexit.register(output_file.close)
+
+    def emit_csv(results, timestamp):
+        output_file.write("{};{}\n".format(timestamp, output_csv(results)))
+
+    def emit_readable(results, timestamp):
+        print(timestamp.split(" ")[1], output_readable(results))
+
+    def emit_plot(results, timestamp):
+        ost = results.mode + ': '
+        if results.operation != 'normal':
+            ost += 'overload'
+        else:
+            ost += str(results.value) + results.unit
+        output_file.write(ost + '\n')
+        print(ost)
+
+    # Resolve the output mode to a single callable up front instead of
+    # re-comparing args.mode strings for every packet.
+    emit = {'csv': emit_csv, 'readable': emit_readable,
+            'plot': emit_plot}[args.mode]
+    # Read the raw byte stream: packets are plain ASCII, so decoding to
+    # str per line only to re-encode for parse() was wasted work.
+    stdin = sys.stdin.buffer
+    # Timestamps come from time_ns(); the date/seconds part of the
+    # string is only re-rendered when the second rolls over, instead of
+    # building a datetime object and isoformat string per packet.
+    last_sec = -1
+    prefix = ""
+    for line in read_frames(stdin):
+        t_ns = time.time_ns()
+        sec = t_ns // 1000000000
+        if sec != last_sec:
+            prefix = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sec))
+            last_sec = sec
+        timestamp = "{}.{:06d}".format(prefix, (t_ns % 1000000000) // 1000)
         if len(line)==9:
             try:
                 results = parse(line)
             except Exception as e:
-                logging.warning('Error "{}" packet from multimeter: "{}"'.format(e, line))
-            if args.mode == 'csv':
-                line = output_csv(results)
-                output_file.write("{};{}\n".format(timestamp, line))
-            elif args.mode == 'readable':
-                line = output_readable(results)
-                print(timestamp.split(" ")[1], line)
-            elif args.mode == 'plot':
-                ost = results['mode'] + ': '
-                if results['operation'] != 'normal':
-                    ost += 'overload'
-                else:
-                    ost += str(results['value']) + results['unit']
-                output_file = open(file_name, 'a')
-                output_file.write(ost + '\n')
-                output_file.close()
-                print(ost)
-            else:
-                raise NotImplementedError
-        elif line:
-            logging.warning('Unknown packet from multimeter: "{}", length: {}'.format(line, len(line)))
+                logging.warning('Error "{}" packet from multimeter: "{}"'.format(e, bytes(line)))
+                continue
+            emit(results, timestamp)
+        elif len(line):
+            logging.warning('Unknown packet from multimeter: "{}", length: {}'.format(bytes(line), len(line)))
         else:
-            logging.warning('Not a response from the multimeter: ""'.format(line))
+            logging.warning('Not a response from the multimeter: ""')
 
 if __name__ == "__main__":
     main()
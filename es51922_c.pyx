@@ -0,0 +1,113 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Optional C accelerator for es51922.parse().
+
+Build in place with
+
+    python setup.py build_ext --inplace
+
+and es51922 picks it up automatically. The lookup tables are copied
+into C arrays at module init from the tables declared in es51922, so
+the two implementations cannot drift apart; only the final Result
+namedtuple is built as a Python object.
+
+Licenced LGPL2+
+"""
+
+import es51922
+
+cdef double _mult[512]
+cdef signed char _dp[512]
+cdef int _pow10[4]
+
+# Python string tables (mode/unit names stay Python objects).
+_mode = [None] * 512
+_unit = [None] * 512
+_display_unit = [None] * 512
+
+_Result = es51922.Result
+
+def _init_tables():
+    cdef int i
+    for i in range(512):
+        _dp[i] = -1
+    for key, entry in es51922._FUNCTION_LUT.items():
+        i = (key >> 8) << 5 | (key & 0xff)
+        _mode[i] = entry[0]
+        _unit[i] = entry[1]
+        _mult[i] = entry[2]
+        _dp[i] = entry[3]
+        _display_unit[i] = entry[4]
+    for i in range(4):
+        _pow10[i] = es51922.POW10[i]
+
+_init_tables()
+
+def parse(const unsigned char[:] packet):
+    """
+    Drop-in replacement for es51922.parse(): same 9-byte packets in,
+    same Result namedtuple out, with all nibble extraction, digit
+    summing and table lookups running as plain C.
+    """
+    if packet.shape[0] < 9:
+        raise ValueError
+    cdef int d_range = packet[0] & 0x0f
+    cdef int display_value = ((packet[1] & 0x0f) * 1000
+                              + (packet[2] & 0x0f) * 100
+                              + (packet[3] & 0x0f) * 10
+                              + (packet[4] & 0x0f))
+    cdef int d_function = packet[5] & 0x0f
+    cdef int d_status = packet[6] & 0x0f
+    cdef int d_option1 = packet[7] & 0x0f
+    cdef int d_option2 = packet[8] & 0x0f
+
+    # The fixed bits of the option nibbles must be zero.
+    if (d_option1 | d_option2) & 0x01:
+        raise ValueError
+    cdef int judge = (d_status >> 3) & 1
+    cdef int sign = (d_status >> 2) & 1
+    cdef int batt = (d_status >> 1) & 1
+    cdef int ol = d_status & 1
+    cdef int hold = (d_option1 >> 3) & 1
+    cdef int maximum = (d_option1 >> 2) & 1
+    cdef int minimum = (d_option1 >> 1) & 1
+    cdef int dc = (d_option2 >> 3) & 1
+    cdef int ac = (d_option2 >> 2) & 1
+    cdef int auto = (d_option2 >> 1) & 1
+    if ac and dc:
+        raise ValueError
+
+    cdef int idx = d_function << 5 | d_range << 1 | judge
+    cdef int dp = _dp[idx]
+    if dp < 0:
+        raise ValueError
+    if sign:
+        display_value = -display_value
+
+    if ol:
+        value = ""
+        display = ""
+    else:
+        value = display_value * _mult[idx] / _pow10[dp]
+        display = "{:.{}f}".format(<double>display_value / _pow10[dp], dp)
+
+    if dc:
+        current = "DC"
+    elif ac:
+        current = "AC"
+    else:
+        current = None
+
+    if maximum:
+        peak = "max"
+    elif minimum:
+        peak = "min"
+    else:
+        peak = None
+
+    return _Result(value=value, unit=_unit[idx], mode=_mode[idx],
+                   current=current,
+                   operation="overload" if ol else "normal",
+                   peak=peak, battery_low=bool(batt), hold=bool(hold),
+                   display_value=display, display_unit=_display_unit[idx],
+                   range="auto" if auto else "manual")
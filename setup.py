@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+"""
+Builds the optional Cython accelerator for es51922.parse():
+
+    python setup.py build_ext --inplace
+
+Everything else in this repository runs without it.
+"""
+
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+extensions = [
+    Extension("es51922_c", ["es51922_c.pyx"],
+              extra_compile_args=["-O3", "-march=native"]),
+]
+
+setup(
+    name="ut803-plot",
+    ext_modules=cythonize(extensions, language_level="3"),
+)